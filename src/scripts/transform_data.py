@@ -1,18 +1,41 @@
 import pandas as pd
-import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import pytesseract
-from PIL import Image
-import re
-from fuzzywuzzy import process
+from rapidfuzz import process, fuzz, utils
 
 # ===============================================================
 # GLOBAL CONFIGURATION
 # ===============================================================
 EXCHANGE_RATE_USD_DZD = 135.0
 
-# Chemin vers Tesseract (à adapter si nécessaire)
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Copy-on-Write : sélections et drop_duplicates restent des vues tant qu'elles ne sont pas modifiées
+pd.set_option('mode.copy_on_write', True)
+
+BASE_DIR = Path(__file__).resolve().parent
+EXTRACTED_DIR = BASE_DIR / '../data/extracted'
+FLAT_FILES_DIR = BASE_DIR / '../data/flat_files'
+TRANSFORMED_DIR = BASE_DIR / '../data/transformed'
+
+# Les tables transformées sont écrites en Parquet ; le CSV reste produit pour create_database.py
+WRITE_CSV = True
+
+# Libellés utilisés par dim_date (indexés par dayofweek / month - 1)
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+MONTH_NAMES = np.array(['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                        'August', 'September', 'October', 'November', 'December'])
+
+# Au-delà de ce nombre de textes distincts, VADER tourne dans un pool de processus
+SENTIMENT_POOL_MIN_TEXTS = 5000
+
+# Les avis sont lus par blocs de cette taille pour borner la mémoire
+REVIEWS_CHUNKSIZE = 100_000
 
 
 def standardize_columns(df):
@@ -21,17 +44,86 @@ def standardize_columns(df):
     return df
 
 
+def wanted_columns(*names):
+    """Filtre usecols pour read_csv : ne lit que les colonnes dont le nom standardisé est demandé"""
+    return lambda col: col.strip().lower().replace(' ', '_') in names
+
+
+def downcast_integers(df, columns):
+    """Réduit les colonnes entières (ids, quantités) au plus petit type entier suffisant"""
+    return df.assign(**{col: pd.to_numeric(df[col], downcast='integer')
+                        for col in columns if col in df.columns})
+
+
+def normalize_labels(series):
+    """Met en minuscules et sans espaces une colonne de libellés, en ne traitant que les valeurs distinctes"""
+    codes, uniques = pd.factorize(series)
+    labels = pc.utf8_trim_whitespace(pc.utf8_lower(pa.array(np.asarray(uniques, dtype=str))))
+    label_codes, categories = pd.factorize(labels.to_numpy(zero_copy_only=False), sort=True)
+    # Trailing -1 slot: missing values (code -1) stay missing, even when every value is missing
+    return pd.Categorical.from_codes(np.append(label_codes, -1)[codes], categories)
+
+
+def sum_by_groups(df, keys, values):
+    """Somme des colonnes values par combinaison observée de keys (factorize + np.bincount), triée par clé"""
+    codes, levels = zip(*(pd.factorize(df[key], sort=True) for key in keys))
+    valid = np.logical_and.reduce([key_codes >= 0 for key_codes in codes])
+    shape = tuple(len(level) for level in levels)
+    size = int(np.prod(shape))
+    group = np.ravel_multi_index([key_codes[valid] for key_codes in codes], shape)
+    observed = np.flatnonzero(np.bincount(group, minlength=size))
+    
+    result = {key: level[position]
+              for key, level, position in zip(keys, levels, np.unravel_index(observed, shape))}
+    for col in values:
+        weights = df[col].to_numpy(dtype=np.float64, na_value=0.0)[valid]
+        # np.bincount returns int64 on empty input: sums are kept float64 either way
+        result[col] = np.bincount(group, weights=weights, minlength=size)[observed].astype(np.float64, copy=False)
+    return pd.DataFrame(result)
+
+
+def join_lookup(df, lookup, on):
+    """Comme df.join(lookup, on=on), mais seules les clés distinctes de df sont cherchées dans l'index de lookup"""
+    if not lookup.index.is_unique:
+        return df.join(lookup, on=on)
+    # Missing keys stay in uniques (use_na_sentinel=False) and reindex to a NaN row
+    codes, uniques = pd.factorize(df[on], use_na_sentinel=False)
+    rows = lookup.reindex(uniques)
+    return df.assign(**{col: rows[col].array.take(codes) for col in lookup.columns})
+
+
+def as_datetime(values):
+    """Convertit en datetime (NaT si invalide), sans re-parser une colonne qui l'est déjà"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, errors='coerce')
+
+
+def month_key(dates):
+    """Mois d'une colonne datetime en entier Int32 (ordinal des Period 'M', mois depuis 1970-01 ; NaT -> NA)"""
+    months = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]')
+    missing = np.isnat(months)
+    return pd.arrays.IntegerArray(np.where(missing, 0, months.astype(np.int64)).astype(np.int32), missing)
+
+
 # ===============================================================
-# 1. LOAD FLAT FILES
+# 1. LOAD FLAT FILES & EXTRACTED TABLES
 # ===============================================================
-def load_flat_files():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    flat_files_dir = os.path.join(base_dir, '../data/flat_files')
+def read_flat_file(path):
+    """Lit un fichier Excel avec calamine (parseur Rust), bien plus rapide qu'openpyxl"""
+    try:
+        return pd.read_excel(path, engine='calamine')
+    except ImportError:
+        # python-calamine not installed: fall back to the default openpyxl reader
+        return pd.read_excel(path, engine='openpyxl')
+
 
+def load_flat_files():
     try:
-        marketing_df = pd.read_excel(os.path.join(flat_files_dir, 'marketing_expenses.xlsx')).copy()
-        targets_df = pd.read_excel(os.path.join(flat_files_dir, 'monthly_targets.xlsx')).copy()
-        shipping_df = pd.read_excel(os.path.join(flat_files_dir, 'shipping_rates.xlsx')).copy()
+        # The three workbooks are independent: parse them concurrently
+        files = ['marketing_expenses.xlsx', 'monthly_targets.xlsx', 'shipping_rates.xlsx']
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            marketing_df, targets_df, shipping_df = executor.map(read_flat_file, [FLAT_FILES_DIR / f for f in files])
 
         marketing_df = standardize_columns(marketing_df)
         targets_df = standardize_columns(targets_df)
@@ -48,26 +140,82 @@ def load_flat_files():
         return None, None, None
 
 
+@dataclass
+class ExtractedTables:
+    """Tables extraites (data/extracted), lues une seule fois et partagées par toutes les étapes"""
+    products: pd.DataFrame = None
+    categories: pd.DataFrame = None
+    subcategories: pd.DataFrame = None
+    cities: pd.DataFrame = None
+    customers: pd.DataFrame = None
+    stores: pd.DataFrame = None
+    sales: pd.DataFrame = None
+
+
+def load_extracted():
+    """Charge chaque CSV extrait une seule fois (None si le fichier est absent)"""
+    def read(name):
+        path = EXTRACTED_DIR / f'{name}.csv'
+        if not path.exists():
+            print(f"⚠ {name}.csv not found")
+            return None
+
+        # Standardized Parquet copy next to the CSV, rebuilt whenever the CSV is newer
+        cache = path.with_suffix('.parquet')
+        if cache.exists() and cache.stat().st_mtime >= path.stat().st_mtime:
+            return pd.read_parquet(cache, engine='pyarrow')
+
+        df = standardize_columns(pd.read_csv(path, engine='pyarrow'))
+        try:
+            df.to_parquet(cache, engine='pyarrow', compression='zstd', index=False)
+        except Exception as e:
+            print(f"⚠ {name}.parquet cache not written: {e}")
+        return df
+
+    # Independent files, read concurrently (the Arrow CSV / Parquet readers release the GIL)
+    names = list(ExtractedTables.__dataclass_fields__)
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        tables = ExtractedTables(**dict(zip(names, executor.map(read, names))))
+
+    # Unify the subcategory key name once for every stage
+    for field in ('products', 'subcategories'):
+        df = getattr(tables, field)
+        if df is None:
+            continue
+        subcat_id_col = next((col for col in ['subcategory_id', 'subcat_id', 'sub_category_id'] 
+                              if col in df.columns), None)
+        if subcat_id_col and subcat_id_col != 'subcat_id':
+            setattr(tables, field, df.rename(columns={subcat_id_col: 'subcat_id'}))
+
+    print("✓ Extracted tables loaded")
+    return tables
+
+
 # ===============================================================
 # 2. CLEAN DATAFRAMES
 # ===============================================================
 def clean_dataframes(marketing_df, targets_df, shipping_df):
-    marketing_df = marketing_df.drop_duplicates().copy()
-    marketing_df['category'] = marketing_df['category'].astype(str).str.lower().str.strip()
-    marketing_df['date'] = pd.to_datetime(marketing_df['date'], errors='coerce')
+    marketing_df = marketing_df.drop_duplicates()
+    marketing_df['category'] = normalize_labels(marketing_df['category'])
+    marketing_df['date'] = as_datetime(marketing_df['date'])
     marketing_df['marketing_cost_usd'] = pd.to_numeric(marketing_df['marketing_cost_usd'], errors='coerce').fillna(0).clip(lower=0)
 
-    targets_df = targets_df.drop_duplicates().copy()
-    targets_df['month'] = pd.to_datetime(targets_df['month'], errors='coerce')
-    targets_df['store_id'] = targets_df['store_id'].astype(str).str.replace(r'^[Ss]tore_?', '', regex=True).str.strip()
-    targets_df['store_id'] = pd.to_numeric(targets_df['store_id'], errors='coerce').astype('Int64')
-    targets_df['target_revenue'] = pd.to_numeric(
-        targets_df['target_revenue'].astype(str).str.replace(',', ''), 
-        errors='coerce'
-    ).fillna(0).clip(lower=0)
-
-    shipping_df = shipping_df.drop_duplicates().copy()
-    shipping_df['region_name'] = shipping_df['region_name'].astype(str).str.lower().str.strip()
+    targets_df = targets_df.drop_duplicates()
+    targets_df['month'] = as_datetime(targets_df['month'])
+    # Strip the "Store_" prefix on the distinct ids only, then broadcast back
+    codes, uniques = pd.factorize(targets_df['store_id'].astype(str))
+    store_ids = [uid[5:].removeprefix('_') if uid[:5] in ('Store', 'store') else uid for uid in uniques]
+    store_ids = pd.to_numeric(pd.Series(store_ids, dtype=object).str.strip(), errors='coerce').astype('Int64')
+    targets_df['store_id'] = store_ids.array.take(codes)
+    # Most revenues are already numeric; only the leftovers go through the string cleanup
+    target_revenue = targets_df['target_revenue']
+    dirty = pd.to_numeric(target_revenue, errors='coerce').isna() & target_revenue.notna()
+    if dirty.any():
+        target_revenue = target_revenue.mask(dirty, target_revenue[dirty].astype(str).str.replace(',', '', regex=False))
+    targets_df['target_revenue'] = pd.to_numeric(target_revenue, errors='coerce').fillna(0).clip(lower=0)
+
+    shipping_df = shipping_df.drop_duplicates()
+    shipping_df['region_name'] = normalize_labels(shipping_df['region_name'])
     shipping_df['shipping_cost'] = pd.to_numeric(shipping_df['shipping_cost'], errors='coerce').fillna(0).clip(lower=0)
 
     print("✓ Cleaning completed")
@@ -86,58 +234,106 @@ def harmonize_currency(marketing_df, targets_df, shipping_df):
 # ===============================================================
 # 4. SENTIMENT ANALYSIS
 # ===============================================================
-def analyze_sentiment():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(base_dir, '../data/extracted/reviews.csv')
-    if not os.path.exists(path):
-        print("✗ reviews.csv not found → sentiment skipped")
-        return pd.DataFrame(columns=['product_id', 'avg_sentiment', 'avg_rating', 'review_count'])
+_analyzer = None
 
-    try:
-        df = standardize_columns(pd.read_csv(path))
-        if not {'review_text', 'product_id', 'rating'}.issubset(df.columns):
-            print("✗ Missing columns in reviews → sentiment skipped")
-            return pd.DataFrame(columns=['product_id', 'avg_sentiment', 'avg_rating', 'review_count'])
 
-        df['review_text'] = df['review_text'].fillna('').astype(str).str.lower().str.strip()
-        df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
-        
-        analyzer = SentimentIntensityAnalyzer()
-        df['sentiment_score'] = df['review_text'].apply(
-            lambda x: round(analyzer.polarity_scores(x)['compound'], 2) if x else 0.0
-        )
+def score_review(text):
+    """Score VADER compound arrondi d'un avis (un analyseur par processus)"""
+    global _analyzer
+    if not text:
+        return 0.0
+    if _analyzer is None:
+        _analyzer = SentimentIntensityAnalyzer()
+    return round(_analyzer.polarity_scores(text)['compound'], 2)
+
+
+# Sommes par produit accumulées bloc par bloc (rating NaN compté 0, exclu de rating_count)
+SENTIMENT_SUMS = ['sentiment_score', 'rating', 'rating_count', 'review_count']
+
+
+def score_reviews(texts):
+    """Scores VADER d'une liste de textes distincts (pool de processus pour les gros volumes)"""
+    if len(texts) >= SENTIMENT_POOL_MIN_TEXTS:
+        # VADER is pure Python, so large batches are spread over processes. They are spawned,
+        # not forked: this runs on a worker thread next to the Arrow thread pools
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn')) as executor:
+            return list(executor.map(score_review, texts, chunksize=256))
+    return [score_review(x) for x in texts]
 
-        result = df.groupby('product_id').agg({
-            'sentiment_score': 'mean',
-            'rating': 'mean',
-            'review_text': 'count'
-        }).reset_index()
-        result.columns = ['product_id', 'avg_sentiment', 'avg_rating', 'review_count']
-        result['avg_sentiment'] = result['avg_sentiment'].round(2)
-        result['avg_rating'] = result['avg_rating'].round(2)
 
-        print(f"✓ Sentiment analysis done ({len(result)} products)")
+def analyze_sentiment(log=print):
+    path = EXTRACTED_DIR / 'reviews.csv'
+    empty = pd.DataFrame(columns=['product_id', 'avg_sentiment', 'avg_rating', 'review_count'])
+    if not path.exists():
+        log("✗ reviews.csv not found → sentiment skipped")
+        return empty
+
+    try:
+        # Reviews are streamed chunk by chunk; only per-product running sums are kept
+        scored = {}
+        partials = []
+        reader = pd.read_csv(path, usecols=wanted_columns('product_id', 'rating', 'review_text'),
+                             chunksize=REVIEWS_CHUNKSIZE)
+        for chunk in reader:
+            df = standardize_columns(chunk)
+            if not {'review_text', 'product_id', 'rating'}.issubset(df.columns):
+                log("✗ Missing columns in reviews → sentiment skipped")
+                return empty
+
+            # Arrow-backed strings: lower/strip run as compiled kernels instead of per-object Python calls
+            df['review_text'] = df['review_text'].astype(pd.ArrowDtype(pa.string())).str.lower().str.strip().fillna('')
+            df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+
+            # Reviews are heavily templated: score each distinct text once (across chunks) and broadcast back
+            codes, uniques = pd.factorize(df['review_text'])
+            new_texts = [x for x in uniques if x not in scored]
+            scored.update(zip(new_texts, score_reviews(new_texts)))
+            df['sentiment_score'] = np.array([scored[x] for x in uniques], dtype=np.float64)[codes]
+
+            df['rating_count'] = df['rating'].notna()
+            df['review_count'] = 1
+            partials.append(sum_by_groups(df, ['product_id'], SENTIMENT_SUMS))
+
+        if not partials:
+            log("⚠ reviews.csv has no rows → sentiment skipped")
+            return empty
+
+        totals = sum_by_groups(pd.concat(partials, ignore_index=True), ['product_id'], SENTIMENT_SUMS)
+        result = pd.DataFrame({
+            'product_id': totals['product_id'],
+            'avg_sentiment': (totals['sentiment_score'] / totals['review_count']).round(2),
+            'avg_rating': (totals['rating'] / totals['rating_count']).round(2),
+            'review_count': totals['review_count'].astype(np.int64)
+        })
+
+        log(f"✓ Sentiment analysis done ({len(result)} products)")
         return result
     except Exception as e:
-        print(f"✗ Error in sentiment analysis: {e} → skipped")
-        return pd.DataFrame(columns=['product_id', 'avg_sentiment', 'avg_rating', 'review_count'])
+        log(f"✗ Error in sentiment analysis: {e} → skipped")
+        return empty
 
 
 # ===============================================================
 # 5. COMPETITOR PRICE INTEGRATION
 # ===============================================================
 def integrate_competitor_prices(products_df):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(base_dir, '../data/extracted/competitor_prices.csv')
+    path = EXTRACTED_DIR / 'competitor_prices.csv'
+
+    if products_df.empty:
+        # No product to match: the competitor file is not read at all
+        products_df['competitor_price'] = np.nan
+        products_df['price_difference'] = np.nan
+        products_df['price_difference_pct'] = np.nan
+        return products_df
 
-    if not os.path.exists(path):
+    if not path.exists():
         print("✗ competitor_prices.csv not found → skipped")
         products_df['competitor_price'] = None
         products_df['price_difference'] = None
         products_df['price_difference_pct'] = None
         return products_df
 
-    if os.path.getsize(path) == 0:
+    if path.stat().st_size == 0:
         print("⚠ competitor_prices.csv is empty → skipped")
         products_df['competitor_price'] = None
         products_df['price_difference'] = None
@@ -145,7 +341,13 @@ def integrate_competitor_prices(products_df):
         return products_df
 
     try:
-        comp_df = standardize_columns(pd.read_csv(path))
+        comp_df = standardize_columns(pd.read_csv(
+            path, usecols=wanted_columns('competitor_product_name', 'competitor_price')
+        ))
+
+        if {'competitor_product_name', 'competitor_price'}.issubset(comp_df.columns):
+            # Competitor rows without a name cannot be matched to anything
+            comp_df = comp_df.dropna(subset=['competitor_product_name'])
 
         if comp_df.empty or not {'competitor_product_name', 'competitor_price'}.issubset(comp_df.columns):
             print("⚠ competitor_prices.csv has no valid data → skipped")
@@ -154,23 +356,43 @@ def integrate_competitor_prices(products_df):
             products_df['price_difference_pct'] = None
             return products_df
 
-        comp_names = comp_df['competitor_product_name'].str.lower().tolist()
-
-        def match(name):
-            if pd.isna(name):
-                return None, None
-            best, score = process.extractOne(name.lower(), comp_names)
-            if score > 80:
-                price = comp_df.loc[comp_df['competitor_product_name'].str.lower() == best, 'competitor_price'].iloc[0]
-                return best, price
-            return None, None
-
-        matches = products_df['product_name'].apply(match)
-        products_df['competitor_price'] = matches.apply(lambda x: x[1])
-        products_df['price_difference'] = products_df['unit_price'] - products_df['competitor_price']
-        products_df['price_difference_pct'] = (
-            (products_df['price_difference'] / products_df['competitor_price']) * 100
-        ).round(2)
+        # Duplicate product names are scored once; missing names get code -1
+        name_codes, unique_names = pd.factorize(products_df['product_name'])
+
+        # Normalize every name once (lowercase, non-alphanumerics stripped) instead of per comparison
+        prod_names = [utils.default_process(name) for name in unique_names]
+        comp_names = [utils.default_process(name) for name in comp_df['competitor_product_name']]
+        comp_prices = pd.to_numeric(comp_df['competitor_price'], errors='coerce').to_numpy(dtype=np.float64)
+
+        # Exact (normalized) name matches need no fuzzy scoring; first listed competitor wins.
+        # Names that normalize to '' (punctuation only) are no exact match for anything
+        exact = {}
+        for idx, name in enumerate(comp_names):
+            if name:
+                exact.setdefault(name, idx)
+        best_idx = np.array([exact.get(name, -1) if name else -1 for name in prod_names], dtype=np.intp)
+        unique_prices = np.where(best_idx >= 0, comp_prices[best_idx], np.nan)
+
+        # One (unmatched products x competitors) WRatio matrix; scores under the cutoff come back as 0.
+        # The old fuzzywuzzy check was 'score > 80' on a score rounded to an integer (round half
+        # to even), i.e. a raw WRatio above 80.5
+        fuzzy = np.flatnonzero(best_idx < 0)
+        scores = process.cdist([prod_names[i] for i in fuzzy], comp_names,
+                               scorer=fuzz.WRatio, score_cutoff=80.5, workers=-1)
+        # argmax keeps the first listed competitor on ties, like extractOne
+        fuzzy_idx = scores.argmax(axis=1)
+        fuzzy_score = scores[np.arange(len(fuzzy)), fuzzy_idx]
+        unique_prices[fuzzy] = np.where(fuzzy_score > 80.5, comp_prices[fuzzy_idx], np.nan)
+        # Trailing NaN slot so that code -1 (missing name) maps to no price
+        products_df['competitor_price'] = np.append(unique_prices, np.nan)[name_codes]
+        # Unmatched (NaN) or zero competitor prices get a NaN pct instead of going through the divide
+        competitor_price = products_df['competitor_price'].to_numpy(dtype=np.float64, na_value=np.nan)
+        price_difference = products_df['unit_price'].to_numpy(dtype=np.float64) - competitor_price
+        price_difference_pct = np.full_like(competitor_price, np.nan)
+        np.divide(price_difference, competitor_price, out=price_difference_pct, where=competitor_price > 0)
+        price_difference_pct *= 100
+        products_df['price_difference'] = price_difference
+        products_df['price_difference_pct'] = np.round(price_difference_pct, 2, out=price_difference_pct)
 
         matched_count = products_df['competitor_price'].notna().sum()
         print(f"✓ {matched_count} competitor prices matched")
@@ -193,60 +415,67 @@ def integrate_competitor_prices(products_df):
 # ===============================================================
 # 6. CREATE DIM_PRODUCT
 # ===============================================================
-def create_dim_product(sentiment_df):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    extracted_dir = os.path.join(base_dir, '../data/extracted')
-    
-    products_path = os.path.join(extracted_dir, 'products.csv')
-    if not os.path.exists(products_path):
-        print("✗ products.csv not found → dim_product skipped")
-        return None
-    
-    products_df = standardize_columns(pd.read_csv(products_path))
-    
-    # Load subcategories and categories
-    subcategories_df = None
-    subcat_path = os.path.join(extracted_dir, 'subcategories.csv')
-    if os.path.exists(subcat_path):
-        subcategories_df = standardize_columns(pd.read_csv(subcat_path))
-    
-    categories_df = None
-    categories_path = os.path.join(extracted_dir, 'categories.csv')
-    if os.path.exists(categories_path):
-        categories_df = standardize_columns(pd.read_csv(categories_path))
-    
-    # Merge with subcategories and categories
+def link_product_categories(products_df, subcategories_df, categories_df):
+    """Ajoute subcat_name, category_id et category_name aux produits (jointures sur index)"""
     if subcategories_df is not None:
-        # Detect column names
-        subcat_id_col = next((col for col in ['subcategory_id', 'subcat_id', 'sub_category_id'] 
-                              if col in subcategories_df.columns), None)
-        if subcat_id_col:
-            subcategories_df = subcategories_df.rename(columns={subcat_id_col: 'subcat_id'})
-        
-        # Detect product subcategory column
-        prod_subcat_col = next((col for col in ['subcategory_id', 'subcat_id', 'sub_category_id'] 
-                                if col in products_df.columns), None)
-        if prod_subcat_col:
-            products_df = products_df.rename(columns={prod_subcat_col: 'subcat_id'})
-        
-        products_df = products_df.merge(
-            subcategories_df[['subcat_id', 'subcat_name', 'category_id']], 
-            on='subcat_id', 
-            how='left'
+        products_df = products_df.join(
+            subcategories_df.set_index('subcat_id')[['subcat_name', 'category_id']],
+            on='subcat_id'
         )
     
     if categories_df is not None:
-        products_df = products_df.merge(
-            categories_df[['category_id', 'category_name']], 
-            on='category_id', 
-            how='left'
+        products_df = products_df.join(
+            categories_df.set_index('category_id')[['category_name']],
+            on='category_id'
         )
+    return products_df
+
+
+def product_categories(tables):
+    """Catégorie brute de chaque produit (Series indexée par product_id) et sa provenance, ou (None, None)"""
+    products_df = tables.products
+    categories_df = tables.categories
+
+    if tables.subcategories is not None and 'subcat_id' in products_df.columns:
+        linked = link_product_categories(products_df, tables.subcategories, categories_df)
+        return linked.set_index('product_id')['category_name'], 'via subcategories'
+
+    cat_col_in_products = next((col for col in ['category', 'category_name', 'category_id'] 
+                                if col in products_df.columns), None)
+    
+    if (cat_col_in_products == 'category_id' and categories_df is not None
+            and 'category_name' in categories_df.columns):
+        linked = link_product_categories(products_df[['product_id', 'category_id']], None, categories_df)
+        return linked.set_index('product_id')['category_name'], 'directly from products + categories'
+    if cat_col_in_products in ['category', 'category_name']:
+        return products_df.set_index('product_id')[cat_col_in_products], 'directly from products'
+    return None, None
+
+
+def build_product_lookup(tables):
+    """Coût unitaire et catégorie brute de chaque produit (indexés par product_id) et provenance de la catégorie, construits une seule fois"""
+    if tables.products is None:
+        return None, None
+    lookup = tables.products.set_index('product_id')[['unit_cost']]
+    category, category_source = product_categories(tables)
+    if category is not None:
+        lookup = lookup.join(category.rename('category'))
+    return lookup, category_source
+
+
+def create_dim_product(sentiment_df, tables):
+    if tables.products is None:
+        print("✗ products.csv not found → dim_product skipped")
+        return None
     
-    # Add sentiment
-    products_df = products_df.merge(sentiment_df, on='product_id', how='left')
-    products_df['avg_sentiment'] = products_df['avg_sentiment'].fillna(0)
-    products_df['avg_rating'] = products_df['avg_rating'].fillna(0)
-    products_df['review_count'] = products_df['review_count'].fillna(0).astype(int)
+    # Attach subcategory / category names and sentiment through indexed joins
+    products_df = link_product_categories(tables.products, tables.subcategories, tables.categories)
+    products_df = products_df.join(sentiment_df.set_index('product_id'), on='product_id')
+    # Products without reviews get 0: one float block for the three columns instead of a fillna per column
+    sentiment = products_df[['avg_sentiment', 'avg_rating', 'review_count']].to_numpy(dtype=np.float64, na_value=0.0)
+    products_df['avg_sentiment'] = sentiment[:, 0]
+    products_df['avg_rating'] = sentiment[:, 1]
+    products_df['review_count'] = sentiment[:, 2].astype(int)
     
     # Add competitor prices
     products_df = integrate_competitor_prices(products_df)
@@ -259,7 +488,10 @@ def create_dim_product(sentiment_df):
         'unit_price', 'unit_cost',
         'competitor_price', 'price_difference', 'price_difference_pct',
         'avg_sentiment', 'avg_rating', 'review_count'
-    ]].copy()
+    ]]
+    # Few distinct names repeated over many products: stored as categorical codes
+    dim_product = dim_product.astype({'subcat_name': 'category', 'category_name': 'category'})
+    dim_product = downcast_integers(dim_product, ['subcat_id', 'category_id', 'review_count'])
     
     print(f"✓ dim_product created ({len(dim_product)} products)")
     return dim_product
@@ -268,81 +500,61 @@ def create_dim_product(sentiment_df):
 # ===============================================================
 # 7. CREATE DIM_STORE
 # ===============================================================
-def create_dim_store(targets_df):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    extracted_dir = os.path.join(base_dir, '../data/extracted')
-    
-    stores_path = os.path.join(extracted_dir, 'stores.csv')
-    cities_path = os.path.join(extracted_dir, 'cities.csv')
-    
-    if not os.path.exists(stores_path) or not os.path.exists(cities_path):
-        print("✗ stores.csv or cities.csv not found → dim_store skipped")
+def create_dim_store(targets_df, tables, log=print):
+    if tables.stores is None or tables.cities is None:
+        log("✗ stores.csv or cities.csv not found → dim_store skipped")
         return None
     
-    stores_df = standardize_columns(pd.read_csv(stores_path))
-    cities_df = standardize_columns(pd.read_csv(cities_path))
-    
-   
-    dim_store = stores_df.merge(
-        cities_df[['city_id', 'city_name', 'region']], 
-        on='city_id', 
-        how='left'
+    # City name and region are looked up once per distinct city_id, then broadcast by code
+    dim_store = join_lookup(
+        tables.stores,
+        tables.cities.set_index('city_id')[['city_name', 'region']].astype('category'),
+        'city_id'
     )
     
-    targets_df['month'] = pd.to_datetime(targets_df['month'], errors='coerce')
-    store_targets = targets_df.groupby('store_id').agg({
+    # groupby already yields targets indexed by store_id, so join without a reset_index / merge
+    store_targets = targets_df.groupby('store_id', sort=False).agg({
         'target_revenue': 'sum',
         'manager_name': 'first'
-    }).reset_index()
+    })
     
-    dim_store = dim_store.merge(
-        store_targets, 
-        on='store_id', 
-        how='left'
-    )
+    dim_store = dim_store.join(store_targets, on='store_id')
     
     
     dim_store = dim_store[[
         'store_id', 'store_name',
         'city_id', 'city_name', 'region',
         'target_revenue', 'manager_name'
-    ]].copy()
+    ]]
+    dim_store = downcast_integers(dim_store, ['store_id', 'city_id'])
     
-    print(f"✓ dim_store created ({len(dim_store)} stores)")
+    log(f"✓ dim_store created ({len(dim_store)} stores)")
     return dim_store
 
 
 # ===============================================================
 # 8. CREATE DIM_CUSTOMER
 # ===============================================================
-def create_dim_customer():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    extracted_dir = os.path.join(base_dir, '../data/extracted')
-    
-    customers_path = os.path.join(extracted_dir, 'customers.csv')
-    cities_path = os.path.join(extracted_dir, 'cities.csv')
-    
-    if not os.path.exists(customers_path) or not os.path.exists(cities_path):
-        print("✗ customers.csv or cities.csv not found → dim_customer skipped")
+def create_dim_customer(tables, log=print):
+    if tables.customers is None or tables.cities is None:
+        log("✗ customers.csv or cities.csv not found → dim_customer skipped")
         return None
     
-    customers_df = standardize_columns(pd.read_csv(customers_path))
-    cities_df = standardize_columns(pd.read_csv(cities_path))
-    
-    
-    dim_customer = customers_df.merge(
-        cities_df[['city_id', 'city_name', 'region']], 
-        on='city_id', 
-        how='left'
+    # City name and region are looked up once per distinct city_id, then broadcast by code
+    dim_customer = join_lookup(
+        tables.customers,
+        tables.cities.set_index('city_id')[['city_name', 'region']].astype('category'),
+        'city_id'
     )
     
     
     dim_customer = dim_customer[[
         'customer_id', 'full_name',
         'city_id', 'city_name', 'region'
-    ]].copy()
+    ]]
+    dim_customer = downcast_integers(dim_customer, ['city_id'])
     
-    print(f"✓ dim_customer created ({len(dim_customer)} customers)")
+    log(f"✓ dim_customer created ({len(dim_customer)} customers)")
     return dim_customer
 
 
@@ -351,27 +563,34 @@ def create_dim_customer():
 # ===============================================================
 def create_dim_date(sales_df):
     
-    all_dates = pd.to_datetime(sales_df['date'].dropna().unique())
+    dates = sales_df['date'].dropna()
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        # fact_sales dates are already datetime64: no re-parse needed
+        all_dates = dates.unique()
+    else:
+        all_dates = pd.to_datetime(dates.unique(), format='ISO8601').to_numpy()
     
+    # np.sort on the datetime64 values replaces the sort_values / reset_index round trip
     dim_date = pd.DataFrame({
-        'date': all_dates
+        'date': np.sort(all_dates)
     })
     
-   
-    dim_date = dim_date.sort_values('date').reset_index(drop=True)
-    
   
-    dim_date['year'] = dim_date['date'].dt.year
-    dim_date['quarter'] = dim_date['date'].dt.quarter
-    dim_date['month'] = dim_date['date'].dt.month
-    dim_date['month_name'] = dim_date['date'].dt.strftime('%B')
-    dim_date['day'] = dim_date['date'].dt.day
-    dim_date['day_of_week'] = dim_date['date'].dt.dayofweek
-    dim_date['day_name'] = dim_date['date'].dt.strftime('%A')
+    # Calendar fields from day / month / year counts since the epoch (1970-01-01 was a Thursday)
+    days = dim_date['date'].to_numpy().astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    month = months.astype(np.int64) % 12 + 1
+    day_of_week = (days.astype(np.int64) + 3) % 7
+    dim_date['year'] = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    dim_date['quarter'] = (month - 1) // 3 + 1
+    dim_date['month'] = month
+    dim_date['month_name'] = MONTH_NAMES[month - 1]
+    dim_date['day'] = (days - months).astype(np.int64) + 1
+    dim_date['day_of_week'] = day_of_week
+    dim_date['day_name'] = DAY_NAMES[day_of_week]
     dim_date['week_of_year'] = dim_date['date'].dt.isocalendar().week.astype(int)
     
-    
-    dim_date['date'] = dim_date['date'].dt.strftime('%Y-%m-%d')
+    dim_date = downcast_integers(dim_date, ['year', 'quarter', 'month', 'day', 'day_of_week', 'week_of_year'])
     
     print(f"✓ dim_date created ({len(dim_date)} dates)")
     return dim_date
@@ -379,157 +598,112 @@ def create_dim_date(sales_df):
 # ===============================================================
 # 10. NET PROFIT CALCULATION & FACT_SALES
 # ===============================================================
-def calculate_net_profit(marketing_df, shipping_df):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    extracted_dir = os.path.join(base_dir, '../data/extracted')
-
-    required_files = ['sales.csv', 'products.csv', 'customers.csv', 'cities.csv', 'categories.csv']
-    for f in required_files:
-        if not os.path.exists(os.path.join(extracted_dir, f)):
-            print(f"✗ Missing required extracted file: {f}")
-            return None
+def calculate_net_profit(marketing_df, shipping_df, tables, product_lookup, category_source):
 
-    
-    sales_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'sales.csv')))
-    products_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'products.csv')))
-    customers_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'customers.csv')))
-    cities_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'cities.csv')))
-    categories_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'categories.csv')))
+    required_tables = ['sales', 'products', 'customers', 'cities', 'categories']
+    for name in required_tables:
+        if getattr(tables, name) is None:
+            print(f"✗ Missing required extracted file: {name}.csv")
+            return None
 
-    
-    subcategories_df = None
-    subcat_path = os.path.join(extracted_dir, 'subcategories.csv')
-    if os.path.exists(subcat_path):
-        subcategories_df = standardize_columns(pd.read_csv(subcat_path))
-        
-        subcat_id_col = next((col for col in ['subcategory_id', 'subcat_id', 'sub_category_id'] 
-                              if col in subcategories_df.columns), None)
-        if subcat_id_col and subcat_id_col != 'subcat_id':
-            subcategories_df = subcategories_df.rename(columns={subcat_id_col: 'subcat_id'})
-        print("✓ subcategories.csv loaded")
+    customers_df = tables.customers
+    cities_df = tables.cities
 
     if 'region' in cities_df.columns and 'region_name' not in cities_df.columns:
         cities_df = cities_df.rename(columns={'region': 'region_name'})
 
 
-    sales_df['date'] = pd.to_datetime(sales_df['date'], errors='coerce')
-    sales_df['month'] = sales_df['date'].dt.to_period('M')
-
-    enriched_df = sales_df.copy()
-
-    
-    enriched_df = enriched_df.merge(products_df[['product_id', 'unit_cost']], on='product_id', how='left')
-
-
-    enriched_df = enriched_df.merge(customers_df[['customer_id', 'city_id']], on='customer_id', how='left')
-    enriched_df = enriched_df.merge(cities_df[['city_id', 'region_name']], on='city_id', how='left')
-    enriched_df = enriched_df.merge(shipping_df[['region_name', 'shipping_cost']], on='region_name', how='left')
-
-   
-    category_added = False
-    if subcategories_df is not None:
-       
-        prod_subcat_col = next((col for col in ['subcategory_id', 'subcat_id', 'sub_category_id'] 
-                                if col in products_df.columns), None)
-        
-        if prod_subcat_col:
-            if prod_subcat_col != 'subcat_id':
-                products_df = products_df.rename(columns={prod_subcat_col: 'subcat_id'})
-            
-            enriched_df = enriched_df.merge(
-                products_df[['product_id', 'subcat_id']], 
-                on='product_id', 
-                how='left'
-            )
-            enriched_df = enriched_df.merge(
-                subcategories_df[['subcat_id', 'category_id']], 
-                on='subcat_id', 
-                how='left'
-            )
-            enriched_df = enriched_df.merge(
-                categories_df[['category_id', 'category_name']], 
-                on='category_id', 
-                how='left'
-            )
-            enriched_df = enriched_df.rename(columns={'category_name': 'category'})
-            category_added = True
-            print("✓ Category added via subcategories")
-
-    
-    if not category_added:
-        cat_col_in_products = next((col for col in ['category', 'category_name', 'category_id'] 
-                                    if col in products_df.columns), None)
-        
-        if cat_col_in_products == 'category_id' and 'category_name' in categories_df.columns:
-            temp = products_df[['product_id', 'category_id']].merge(
-                categories_df[['category_id', 'category_name']], on='category_id', how='left'
-            )
-            temp = temp.rename(columns={'category_name': 'category'})
-            enriched_df = enriched_df.merge(temp[['product_id', 'category']], on='product_id', how='left')
-            category_added = True
-            print("✓ Category added directly from products + categories")
-        elif cat_col_in_products in ['category', 'category_name']:
-            enriched_df = enriched_df.merge(
-                products_df[['product_id', cat_col_in_products]].rename(columns={cat_col_in_products: 'category'}),
-                on='product_id', how='left'
-            )
-            category_added = True
-            print("✓ Category added directly from products")
-
-    
-    if not category_added:
+    # Lookups are resolved on the small dimension tables first, so the fact table is joined
+    # once per dimension instead of once per lookup
+    customer_lookup = (
+        customers_df.set_index('customer_id')[['city_id']]
+        .join(cities_df.set_index('city_id')[['region_name']], on='city_id')
+        .join(shipping_df.set_index('region_name')[['shipping_cost']], on='region_name')
+    )
+    # Lookups must hold one row per key (e.g. one shipping cost per region), otherwise the joins
+    # below duplicate the matching sales rows: checked once here on the small dimension side
+    for name, lookup in (('customer', customer_lookup), ('product', product_lookup)):
+        if not lookup.index.is_unique:
+            print(f"⚠ Several {name} lookup rows share the same key → matching sales rows will be duplicated")
+
+    has_category = 'category' in product_lookup.columns
+    if has_category:
+        print(f"✓ Category added {category_source}")
+
+    # The joins build a new frame, so the shared sales table is never modified
+    enriched_df = join_lookup(join_lookup(tables.sales, product_lookup, 'product_id'), customer_lookup, 'customer_id')
+    enriched_df['date'] = as_datetime(enriched_df['date'])
+    enriched_df['month'] = month_key(enriched_df['date'])
+
+    # .any() stops at the first matched row; shipping then counts as 0 everywhere
+    if not enriched_df['shipping_cost'].notna().any():
+        print("⚠ No shipping costs matched the customers' regions → shipping_cost_total = 0")
+
+    if not has_category:
         enriched_df['category'] = 'unknown'
         print("⚠ No category link found → using 'unknown'")
 
    
-    enriched_df['category'] = enriched_df['category'].astype(str).str.lower().str.strip()
+    enriched_df['category'] = normalize_labels(enriched_df['category'])
 
-    marketing_df['month'] = marketing_df['date'].dt.to_period('M')
-    marketing_df['category'] = marketing_df['category'].astype(str).str.lower().str.strip()
+    marketing_df['month'] = month_key(marketing_df['date'])
 
-    cat_month_rev = enriched_df.groupby(['category', 'month'])['total_revenue'].sum().reset_index(name='cat_month_total')
-    enriched_df = enriched_df.merge(cat_month_rev, on=['category', 'month'], how='left')
-    enriched_df = enriched_df.merge(
-        marketing_df[['category', 'month', 'marketing_cost_dzd']], 
-        on=['category', 'month'], 
-        how='left'
+    # The per-row totals and marketing costs are only inputs to the arithmetic below: they stay
+    # local arrays instead of widening enriched_df with two more columns
+    cat_month_total = (
+        enriched_df.groupby(['category', 'month'], sort=False, observed=True)['total_revenue']
+        .transform('sum').to_numpy(dtype=np.float64, na_value=0.0)
     )
 
-    enriched_df['allocated_marketing_dzd'] = (
-        enriched_df['total_revenue'] / enriched_df['cat_month_total']
-    ) * enriched_df['marketing_cost_dzd']
-
-
-    enriched_df['cost'] = enriched_df['unit_cost'] * enriched_df['quantity']
-    enriched_df['shipping_cost_total'] = enriched_df['shipping_cost'] * enriched_df['quantity']
-    enriched_df.fillna({
-        'shipping_cost': 0, 
-        'shipping_cost_total': 0,
-        'allocated_marketing_dzd': 0, 
-        'unit_cost': 0,
-        'cost': 0
-    }, inplace=True)
-
-    enriched_df['gross_profit'] = enriched_df['total_revenue'] - enriched_df['cost']
-
-    
-    enriched_df['net_profit'] = (
-        enriched_df['gross_profit'] -
-        enriched_df['shipping_cost_total'] -
-        enriched_df['allocated_marketing_dzd']
-    ).round(2)
-
-    enriched_df.drop(columns=['cat_month_total', 'marketing_cost_dzd', 'shipping_cost', 
-                              'category', 'region_name', 'city_id', 'subcat_id', 'category_id'], 
-                     errors='ignore', inplace=True)
+    # One marketing cost per (category, month): several campaigns in the same month are summed
+    mkt = marketing_df.groupby(['category', 'month'], sort=False, observed=True)['marketing_cost_dzd'].sum()
+    marketing_cost = (
+        pd.MultiIndex.from_frame(enriched_df[['category', 'month']]).map(mkt)
+        .to_numpy(dtype=np.float64, na_value=0.0)
+    )
 
-   
-    fact_sales = enriched_df[[
-        'trans_id', 'date', 'store_id', 'product_id', 'customer_id',
-        'quantity', 'total_revenue', 'cost', 
-        'gross_profit', 'shipping_cost_total', 
-        'allocated_marketing_dzd', 'net_profit'
-    ]].copy()
+    # Profit arithmetic on plain float arrays: one pass, no intermediate Series
+    total_revenue = enriched_df['total_revenue'].to_numpy(dtype=np.float64)
+    quantity = enriched_df['quantity'].to_numpy(dtype=np.float64)
+    unit_cost = enriched_df['unit_cost'].to_numpy(dtype=np.float64, na_value=0.0)
+    shipping_cost = enriched_df['shipping_cost'].to_numpy(dtype=np.float64, na_value=0.0)
+
+    # Rows without a marketing spend keep 0 and skip the division entirely
+    allocated = np.zeros_like(total_revenue)
+    np.divide(total_revenue, cat_month_total, out=allocated, where=(cat_month_total > 0) & (marketing_cost > 0))
+    allocated *= marketing_cost
+    cost = unit_cost * quantity
+    shipping_cost_total = shipping_cost * quantity
+    gross_profit = total_revenue - cost
+
+    # net profit reuses a single buffer for both subtractions and the rounding
+    net_profit = np.subtract(gross_profit, shipping_cost_total)
+    net_profit -= allocated
+    np.round(net_profit, 2, out=net_profit)
+
+    # fact_sales is built once from its columns instead of inserting the results into the
+    # wide enriched frame and projecting it. product_id / customer_id string codes (P100, C0001)
+    # are kept as Arrow strings rather than Python objects; numeric ids keep their dtype so they
+    # still match the product lookup. Amounts stay float64: float32 cannot hold DZD cents
+    # exactly past ~167k
+    ids = downcast_integers(enriched_df[['trans_id', 'store_id', 'quantity']], ['trans_id', 'store_id', 'quantity'])
+    codes = enriched_df[['product_id', 'customer_id']]
+    codes = codes.astype({col: pd.ArrowDtype(pa.string()) for col in codes.columns
+                          if pd.api.types.is_string_dtype(codes[col])})
+    fact_sales = pd.DataFrame({
+        'trans_id': ids['trans_id'],
+        'date': enriched_df['date'],
+        'store_id': ids['store_id'],
+        'product_id': codes['product_id'],
+        'customer_id': codes['customer_id'],
+        'quantity': ids['quantity'],
+        'total_revenue': enriched_df['total_revenue'],
+        'cost': cost,
+        'gross_profit': gross_profit,
+        'shipping_cost_total': shipping_cost_total,
+        'allocated_marketing_dzd': allocated,
+        'net_profit': net_profit
+    })
 
     print(f"✓ fact_sales created ({len(fact_sales)} transactions)")
     return fact_sales
@@ -537,61 +711,32 @@ def calculate_net_profit(marketing_df, shipping_df):
 # ===============================================================
 # 11. CALCULATE MARKETING ROI
 # ===============================================================
-def calculate_marketing_roi(fact_sales_df, marketing_df):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    extracted_dir = os.path.join(base_dir, '../data/extracted')
+def calculate_marketing_roi(fact_sales_df, marketing_df, product_lookup):
     
     try:
-        products_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'products.csv')))
-        categories_df = standardize_columns(pd.read_csv(os.path.join(extracted_dir, 'categories.csv')))
-        
-       
-        fact_with_cat = fact_sales_df.copy()
-        
+        # Category comes from the shared product lookup, broadcast to the sales rows by code
+        category = None
+        if product_lookup is not None and 'category' in product_lookup.columns:
+            category = product_lookup[['category']]
         
-        prod_subcat_col = next((col for col in ['subcategory_id', 'subcat_id', 'sub_category_id'] 
-                                if col in products_df.columns), None)
-        
-        if prod_subcat_col:
-            if prod_subcat_col != 'subcat_id':
-                products_df = products_df.rename(columns={prod_subcat_col: 'subcat_id'})
-            
-            fact_with_cat = fact_with_cat.merge(
-                products_df[['product_id', 'subcat_id']], 
-                on='product_id', 
-                how='left'
-            )
-            
-            subcat_path = os.path.join(extracted_dir, 'subcategories.csv')
-            if os.path.exists(subcat_path):
-                subcategories_df = standardize_columns(pd.read_csv(subcat_path))
-                subcat_id_col = next((col for col in ['subcategory_id', 'subcat_id'] 
-                                      if col in subcategories_df.columns), 'subcat_id')
-                if subcat_id_col != 'subcat_id':
-                    subcategories_df = subcategories_df.rename(columns={subcat_id_col: 'subcat_id'})
-                
-                fact_with_cat = fact_with_cat.merge(
-                    subcategories_df[['subcat_id', 'category_id']], 
-                    on='subcat_id', 
-                    how='left'
-                )
-        
-        fact_with_cat = fact_with_cat.merge(
-            categories_df[['category_id', 'category_name']], 
-            on='category_id', 
-            how='left'
-        )
-        fact_with_cat['category'] = fact_with_cat['category_name'].str.lower().str.strip()
-        fact_with_cat['month'] = fact_with_cat['date'].dt.to_period('M')
+        fact_with_cat = fact_sales_df[['product_id', 'date', 'total_revenue', 'allocated_marketing_dzd']]
+        if category is None:
+            fact_with_cat = fact_with_cat.assign(category='unknown')
+        else:
+            fact_with_cat = join_lookup(fact_with_cat, category, 'product_id')
+        fact_with_cat['category'] = normalize_labels(fact_with_cat['category'])
+        fact_with_cat['month'] = month_key(fact_with_cat['date'])
         
-        roi_df = fact_with_cat.groupby(['category', 'month']).agg({
-            'total_revenue': 'sum',
-            'allocated_marketing_dzd': 'sum'
-        }).reset_index()
-        roi_df['roi_percent'] = (
-            (roi_df['total_revenue'] - roi_df['allocated_marketing_dzd']) /
-            roi_df['allocated_marketing_dzd'] * 100
-        ).round(2).replace([float('inf'), -float('inf')], 0)
+        roi_df = sum_by_groups(fact_with_cat, ['category', 'month'], ['total_revenue', 'allocated_marketing_dzd'])
+        # Month keys are Period ordinals: back to YYYY-MM periods for the output only
+        roi_df['month'] = pd.PeriodIndex.from_ordinals(roi_df['month'].to_numpy(dtype=np.int64), freq='M')
+        # No division where nothing was spent: ROI 0 there (NaN when there was no revenue either)
+        margin = roi_df['total_revenue'].to_numpy() - roi_df['allocated_marketing_dzd'].to_numpy()
+        spent = roi_df['allocated_marketing_dzd'].to_numpy()
+        roi_percent = np.where(margin == 0, np.nan, 0.0)
+        np.divide(margin, spent, out=roi_percent, where=spent != 0)
+        roi_percent *= 100
+        roi_df['roi_percent'] = np.round(roi_percent, 2, out=roi_percent)
         
         print(f"✓ Marketing ROI calculated ({len(roi_df)} category-months)")
         return roi_df
@@ -604,49 +749,71 @@ def calculate_marketing_roi(fact_sales_df, marketing_df):
 # ===============================================================
 # 13. SAVE ALL TABLES
 # ===============================================================
+def day_dates(df):
+    """Ramène une colonne 'date' datetime au jour (date32 Arrow), pour que Parquet et CSV publient la même valeur"""
+    if 'date' not in df.columns or not pd.api.types.is_datetime64_any_dtype(df['date']):
+        return df
+    days = pa.array(df['date'].to_numpy(dtype='datetime64[D]'), from_pandas=True)
+    return df.assign(date=pd.arrays.ArrowExtensionArray(days))
+
+
+def write_csv(df, path):
+    """Écrit df en CSV avec le writer Arrow (C++, multithread) ; mois en YYYY-MM"""
+    periods = {col: df[col].astype(str) for col in df.columns if isinstance(df[col].dtype, pd.PeriodDtype)}
+    try:
+        table = pa.Table.from_pandas(df.assign(**periods), preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Column Arrow cannot type (mixed Python objects): the pandas writer still handles it
+        df.to_csv(path, index=False, date_format='%Y-%m-%d')
+        return
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    pa_csv.write_csv(table, path)
+
+
+def write_parquet(df, path):
+    """Écrit df en Parquet (zstd)"""
+    df.to_parquet(path, engine='pyarrow', compression='zstd', index=False)
+
+
 def save_all_tables(dim_product, dim_store, dim_customer, dim_date, fact_sales, marketing_roi):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(base_dir, '../data/transformed')
-    os.makedirs(output_dir, exist_ok=True)
+    TRANSFORMED_DIR.mkdir(parents=True, exist_ok=True)
     
     tables = {
-        'dim_product.csv': dim_product,
-        'dim_store.csv': dim_store,
-        'dim_customer.csv': dim_customer,
-        'dim_date.csv': dim_date,
-        'fact_sales.csv': fact_sales,
-        'marketing_roi.csv': marketing_roi
+        'dim_product': dim_product,
+        'dim_store': dim_store,
+        'dim_customer': dim_customer,
+        'dim_date': dim_date,
+        'fact_sales': fact_sales,
+        'marketing_roi': marketing_roi
     }
     
-    for filename, df in tables.items():
+    # CSV first: create_database.py and the notebook load it, so a Parquet failure must not drop it
+    writers = ([('csv', write_csv)] if WRITE_CSV else []) + [('parquet', write_parquet)]
+    
+    for name, df in tables.items():
         if df is not None and not df.empty:
-            path = os.path.join(output_dir, filename)
+            # Dates are cut to the day once, so both formats hold the same values
+            df = day_dates(df)
+            saved = True
+            for ext, write in writers:
+                try:
+                    write(df, TRANSFORMED_DIR / f'{name}.{ext}')
+                except PermissionError:
+                    saved = False
+                    print(f"✗ ERROR: {name}.{ext} is open in another program (Excel?)")
+                    print("   Please close the file and run the script again.")
+                except Exception as e:
+                    saved = False
+                    print(f"✗ Error saving {name}.{ext}: {e}")
             
-            try:
-             
-                if filename == 'dim_date.csv' and 'date' in df.columns:
-                    df_copy = df.copy()
-                    df_copy['date'] = df_copy['date'].astype(str)
-                    df_copy.to_csv(path, index=False)
-               
-                elif filename == 'fact_sales.csv' and 'date' in df.columns:
-                    df_copy = df.copy()
-                    df_copy['date'] = pd.to_datetime(df_copy['date']).dt.strftime('%Y-%m-%d')
-                    df_copy.to_csv(path, index=False)
-                else:
-                    df.to_csv(path, index=False)
-                
-                print(f"✓ Saved: {filename} ({len(df)} rows)")
-            
-            except PermissionError:
-                print(f"✗ ERROR: {filename} is open in another program (Excel?)")
-                print(f"   Please close the file and run the script again.")
-            except Exception as e:
-                print(f"✗ Error saving {filename}: {e}")
+            if saved:
+                print(f"✓ Saved: {name} ({len(df)} rows)")
         else:
-            print(f"⚠ Skipped: {filename} (empty or None)")
+            print(f"⚠ Skipped: {name} (empty or None)")
     
-    print(f"\n✓ All tables saved to: {output_dir}")
+    print(f"\n✓ All tables saved to: {TRANSFORMED_DIR}")
 
 
 # ===============================================================
@@ -657,12 +824,13 @@ def main():
     print("ETL PIPELINE - TRANSFORMATION PHASE")
     print("=" * 70)
     
-    # Step 1: Load flat files
+    # Step 1: Load flat files & extracted tables
     print("\n[1/9] Loading flat files...")
     marketing_df, targets_df, shipping_df = load_flat_files()
     if marketing_df is None:
         print("✗ Cannot proceed without flat files")
         return
+    tables = load_extracted()
     
     # Step 2: Clean dataframes
     print("\n[2/9] Cleaning dataframes...")
@@ -672,19 +840,31 @@ def main():
     print("\n[3/9] Harmonizing currency...")
     marketing_df, targets_df, shipping_df = harmonize_currency(marketing_df, targets_df, shipping_df)
     
-    # Step 4: Sentiment analysis
-    print("\n[4/9] Analyzing sentiment...")
-    sentiment_df = analyze_sentiment()
-    
-    # Step 5: Create dimension tables
-    print("\n[5/9] Creating dimension tables...")
-    dim_product = create_dim_product(sentiment_df)
-    dim_store = create_dim_store(targets_df)
-    dim_customer = create_dim_customer()
+    # Steps 4-5: Sentiment analysis & dimension tables
+    # dim_store / dim_customer do not depend on sentiment, so they run alongside it. The workers
+    # collect their messages instead of printing, and the main thread prints them in step order
+    logs = {'sentiment': [], 'store': [], 'customer': []}
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        sentiment_future = pool.submit(analyze_sentiment, log=logs['sentiment'].append)
+        store_future = pool.submit(create_dim_store, targets_df, tables, log=logs['store'].append)
+        customer_future = pool.submit(create_dim_customer, tables, log=logs['customer'].append)
+        
+        print("\n[4/9] Analyzing sentiment...")
+        sentiment_df = sentiment_future.result()
+        print(*logs['sentiment'], sep='\n')
+        
+        print("\n[5/9] Creating dimension tables...")
+        dim_product = create_dim_product(sentiment_df, tables)
+        dim_store = store_future.result()
+        print(*logs['store'], sep='\n')
+        dim_customer = customer_future.result()
+        print(*logs['customer'], sep='\n')
     
     # Step 6: Calculate net profit & create fact_sales
     print("\n[6/9] Calculating net profit & creating fact_sales...")
-    fact_sales = calculate_net_profit(marketing_df, shipping_df)
+    # unit_cost and category are resolved once per product and shared by steps 6 and 8
+    product_lookup, category_source = build_product_lookup(tables)
+    fact_sales = calculate_net_profit(marketing_df, shipping_df, tables, product_lookup, category_source)
     if fact_sales is None:
         print("✗ Cannot proceed without fact_sales")
         return
@@ -695,7 +875,7 @@ def main():
     
     # Step 8: Calculate marketing ROI
     print("\n[8/9] Calculating marketing ROI...")
-    marketing_roi = calculate_marketing_roi(fact_sales, marketing_df)
+    marketing_roi = calculate_marketing_roi(fact_sales, marketing_df, product_lookup)
     
     # Step 9: Save all tables
     print("\n[9/9] Saving all tables...")